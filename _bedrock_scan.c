@@ -0,0 +1,291 @@
+/* Горячий путь сканера на C: один сокет, sendmmsg батчами,
+ * poll + recvmmsg, демультиплексация ответов по куки в timestamp.
+ * Python-обёртка: _bedrock_scan.scan(ip, port_lo, port_hi, timeout_ms[, grace_ms])
+ * -> (list[int] активных портов, bytes первого pong-а или None).
+ */
+#ifndef _GNU_SOURCE
+#define _GNU_SOURCE /* sendmmsg/recvmmsg, SOCK_NONBLOCK */
+#endif
+
+#define PY_SSIZE_T_CLEAN
+#include <Python.h>
+
+#include <arpa/inet.h>
+#include <errno.h>
+#include <netinet/in.h>
+#include <poll.h>
+#include <stdint.h>
+#include <string.h>
+#include <sys/socket.h>
+#include <time.h>
+#include <unistd.h>
+
+#define PROBE_LEN 33
+#define BATCH 64
+#define RBUF_LEN 2048
+/* Несколько исходящих сокетов: файрволы часто режут UDP по 5-tuple или
+ * по src-порту, чередование src-портов это обходит. */
+#define N_SRC 4
+
+static const unsigned char MAGIC[16] = {
+    0x00, 0xff, 0xff, 0x00, 0xfe, 0xfe, 0xfe, 0xfe,
+    0xfd, 0xfd, 0xfd, 0xfd, 0x12, 0x34, 0x56, 0x78
+};
+
+static double
+now_ms(void)
+{
+    struct timespec ts;
+    clock_gettime(CLOCK_MONOTONIC, &ts);
+    return ts.tv_sec * 1000.0 + ts.tv_nsec / 1e6;
+}
+
+static PyObject *
+scan(PyObject *self, PyObject *args)
+{
+    const char *ip;
+    int port_lo, port_hi, timeout_ms;
+    int grace_ms = 350;
+
+    if (!PyArg_ParseTuple(args, "siii|i", &ip, &port_lo, &port_hi,
+                          &timeout_ms, &grace_ms))
+        return NULL;
+
+    if (port_lo < 1 || port_hi > 65535 || port_hi < port_lo) {
+        PyErr_SetString(PyExc_ValueError, "bad port range");
+        return NULL;
+    }
+
+    struct in_addr dst;
+    if (inet_aton(ip, &dst) == 0) {
+        PyErr_SetString(PyExc_ValueError, "bad IPv4 address");
+        return NULL;
+    }
+
+    int n = port_hi - port_lo + 1;
+
+    int fds[N_SRC];
+    for (int k = 0; k < N_SRC; k++) {
+        fds[k] = socket(AF_INET, SOCK_DGRAM | SOCK_NONBLOCK, 0);
+        if (fds[k] < 0) {
+            while (--k >= 0)
+                close(fds[k]);
+            return PyErr_SetFromErrno(PyExc_OSError);
+        }
+        int rcvbuf = 8 * 1024 * 1024;
+        int sndbuf = 2 * 1024 * 1024;
+        setsockopt(fds[k], SOL_SOCKET, SO_RCVBUF, &rcvbuf, sizeof(rcvbuf));
+        setsockopt(fds[k], SOL_SOCKET, SO_SNDBUF, &sndbuf, sizeof(sndbuf));
+    }
+
+    unsigned char *probes = malloc((size_t)n * PROBE_LEN);
+    struct sockaddr_in *addrs = calloc(n, sizeof(*addrs));
+    struct iovec *iovs = calloc(n, sizeof(*iovs));
+    struct mmsghdr *hdrs = calloc(n, sizeof(*hdrs));
+    unsigned char *active = calloc(n, 1);
+    unsigned char *rbufs = malloc((size_t)BATCH * RBUF_LEN);
+    unsigned char first_buf[RBUF_LEN];
+    int first_len = 0;
+    int first_port = 0;
+
+    if (!probes || !addrs || !iovs || !hdrs || !active || !rbufs) {
+        free(probes); free(addrs); free(iovs); free(hdrs);
+        free(active); free(rbufs);
+        for (int k = 0; k < N_SRC; k++)
+            close(fds[k]);
+        return PyErr_NoMemory();
+    }
+
+    for (int i = 0; i < n; i++) {
+        unsigned char *p = probes + (size_t)i * PROBE_LEN;
+        uint64_t cookie = (uint64_t)(port_lo + i);
+
+        /* 0x01 | куки-порт (be64) | MAGIC | нулевой GUID */
+        p[0] = 0x01;
+        for (int b = 0; b < 8; b++)
+            p[1 + b] = (unsigned char)(cookie >> (56 - 8 * b));
+        memcpy(p + 9, MAGIC, sizeof(MAGIC));
+        memset(p + 25, 0, 8);
+
+        addrs[i].sin_family = AF_INET;
+        addrs[i].sin_port = htons((uint16_t)(port_lo + i));
+        addrs[i].sin_addr = dst;
+        iovs[i].iov_base = p;
+        iovs[i].iov_len = PROBE_LEN;
+        hdrs[i].msg_hdr.msg_name = &addrs[i];
+        hdrs[i].msg_hdr.msg_namelen = sizeof(addrs[i]);
+        hdrs[i].msg_hdr.msg_iov = &iovs[i];
+        hdrs[i].msg_hdr.msg_iovlen = 1;
+    }
+
+    Py_BEGIN_ALLOW_THREADS
+
+    int sent = 0;
+    int batch_idx = 0;
+    while (sent < n) {
+        int want = n - sent > BATCH ? BATCH : n - sent;
+        int fd = fds[batch_idx % N_SRC]; /* батчи чередуют src-порты */
+        int r = sendmmsg(fd, hdrs + sent, want, 0);
+        if (r > 0) {
+            sent += r;
+            batch_idx++;
+            continue;
+        }
+        if (errno == EAGAIN || errno == EWOULDBLOCK || errno == EINTR) {
+            struct pollfd pw = { fd, POLLOUT, 0 };
+            poll(&pw, 1, 10);
+            continue;
+        }
+        break; /* ICMP и прочее - дальше слать смысла нет */
+    }
+
+    double deadline = now_ms() + timeout_ms;
+    double first_t = -1.0;
+
+    for (;;) {
+        /* После первого ответа ждём только grace_ms - соседние порты
+         * того же хоста отвечают за тот же RTT. */
+        double dl = deadline;
+        if (first_t >= 0 && first_t + grace_ms < dl)
+            dl = first_t + grace_ms;
+
+        int wait = (int)(dl - now_ms());
+        if (wait <= 0)
+            break;
+
+        struct pollfd pfds[N_SRC];
+        for (int k = 0; k < N_SRC; k++) {
+            pfds[k].fd = fds[k];
+            pfds[k].events = POLLIN;
+            pfds[k].revents = 0;
+        }
+        int pr = poll(pfds, N_SRC, wait);
+        if (pr < 0 && errno == EINTR)
+            continue;
+        if (pr <= 0)
+            break;
+
+        for (int k = 0; k < N_SRC; k++) {
+        if (!(pfds[k].revents & POLLIN))
+            continue;
+
+        struct mmsghdr rhdrs[BATCH];
+        struct iovec riovs[BATCH];
+        struct sockaddr_in raddrs[BATCH];
+
+        memset(rhdrs, 0, sizeof(rhdrs));
+        for (int i = 0; i < BATCH; i++) {
+            riovs[i].iov_base = rbufs + (size_t)i * RBUF_LEN;
+            riovs[i].iov_len = RBUF_LEN;
+            rhdrs[i].msg_hdr.msg_name = &raddrs[i];
+            rhdrs[i].msg_hdr.msg_namelen = sizeof(raddrs[i]);
+            rhdrs[i].msg_hdr.msg_iov = &riovs[i];
+            rhdrs[i].msg_hdr.msg_iovlen = 1;
+        }
+
+        int rr = recvmmsg(fds[k], rhdrs, BATCH, 0, NULL);
+        if (rr <= 0)
+            continue;
+
+        for (int i = 0; i < rr; i++) {
+            unsigned int len = rhdrs[i].msg_len;
+            unsigned char *d = rbufs + (size_t)i * RBUF_LEN;
+
+            if (len < 9 || d[0] != 0x1c)
+                continue;
+            if (raddrs[i].sin_addr.s_addr != dst.s_addr)
+                continue;
+
+            uint64_t cookie = 0;
+            for (int b = 0; b < 8; b++)
+                cookie = (cookie << 8) | d[1 + b];
+
+            int port;
+            if (cookie >= (uint64_t)port_lo && cookie <= (uint64_t)port_hi)
+                port = (int)cookie;
+            else
+                port = ntohs(raddrs[i].sin_port); /* куки не вернули */
+
+            if (port < port_lo || port > port_hi)
+                continue;
+
+            if (!active[port - port_lo]) {
+                active[port - port_lo] = 1;
+                if (first_t < 0)
+                    first_t = now_ms();
+            }
+            /* payload держим от наименьшего ответившего порта -
+             * как active_ports[0] на питоновской стороне */
+            if (first_len == 0 || port < first_port) {
+                first_port = port;
+                first_len = (int)len;
+                memcpy(first_buf, d, len);
+            }
+        }
+        }
+    }
+
+    for (int k = 0; k < N_SRC; k++)
+        close(fds[k]);
+
+    Py_END_ALLOW_THREADS
+
+    PyObject *ports_list = PyList_New(0);
+    PyObject *payload = NULL;
+    if (ports_list == NULL)
+        goto fail;
+
+    for (int i = 0; i < n; i++) {
+        if (!active[i])
+            continue;
+        PyObject *num = PyLong_FromLong(port_lo + i);
+        if (num == NULL || PyList_Append(ports_list, num) < 0) {
+            Py_XDECREF(num);
+            goto fail;
+        }
+        Py_DECREF(num);
+    }
+
+    if (first_len > 0) {
+        payload = PyBytes_FromStringAndSize((const char *)first_buf, first_len);
+    }
+    else {
+        payload = Py_None;
+        Py_INCREF(payload);
+    }
+    if (payload == NULL)
+        goto fail;
+
+    free(probes); free(addrs); free(iovs); free(hdrs);
+    free(active); free(rbufs);
+
+    PyObject *res = PyTuple_Pack(2, ports_list, payload);
+    Py_DECREF(ports_list);
+    Py_DECREF(payload);
+    return res;
+
+fail:
+    Py_XDECREF(ports_list);
+    Py_XDECREF(payload);
+    free(probes); free(addrs); free(iovs); free(hdrs);
+    free(active); free(rbufs);
+    return NULL;
+}
+
+static PyMethodDef methods[] = {
+    { "scan", scan, METH_VARARGS,
+      "scan(ip, port_lo, port_hi, timeout_ms[, grace_ms]) -> (active_ports, first_pong)" },
+    { NULL, NULL, 0, NULL }
+};
+
+static struct PyModuleDef module = {
+    PyModuleDef_HEAD_INIT, "_bedrock_scan",
+    "Батчевый UDP-скан Bedrock серверов (sendmmsg/recvmmsg).",
+    -1, methods
+};
+
+PyMODINIT_FUNC
+PyInit__bedrock_scan(void)
+{
+    return PyModule_Create(&module);
+}
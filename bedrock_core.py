@@ -0,0 +1,416 @@
+"""Общее ядро сканера Bedrock серверов.
+
+Здесь живёт вся логика сканирования и разбора ответов; боты
+(scannerV1.py, ScannerV2.py) только навешивают свои хендлеры.
+"""
+import ctypes
+import logging
+import re
+import socket
+import struct
+import sys
+from datetime import datetime
+import asyncio
+
+PORT_RANGE = (19130, 19630)
+SCAN_TIMEOUT = 1.5
+# Сколько ещё ждать отставшие порты после первого ответа хоста
+FIRST_REPLY_GRACE = 0.35
+MAX_CONCURRENT_SCANS = 8
+
+# Магия RakNet. В поле timestamp кладём номер порта как куки: pong
+# возвращает его эхом, и ответ привязывается к порту, даже если NAT
+# переписал src-порт. Диапазон фиксированный - собираем пакеты заранее.
+MAGIC = b'\x00\xff\xff\x00\xfe\xfe\xfe\xfe\xfd\xfd\xfd\xfd\x12\x34\x56\x78'
+PROBE_PACKETS = {
+    port: b'\x01' + struct.pack('>Q', port) + MAGIC + struct.pack('>Q', 0)
+    for port in range(PORT_RANGE[0], PORT_RANGE[1] + 1)
+}
+
+PORT_COUNT = PORT_RANGE[1] - PORT_RANGE[0] + 1
+
+# Предсобранные шаблоны ответа - строки-константы не пересоздаются на каждый скан
+NO_PORTS_TEMPLATE = (
+    "<b>[{ts}] ❌ Результаты сканирования {host}</b>\n\n"
+    "🔢 Проверено портов: <code>{port_count}</code>\n"
+    "📂 Активные порты: <b>не найдено</b>\n\n"
+    "⏱ Время сканирования: {scan_time:.2f} сек"
+).format
+
+RESULT_HEADER_TEMPLATE = (
+    "<b>[{ts}] ✅ Результаты сканирования {host}</b>\n\n"
+    "🔢 Проверено портов: <code>{port_count}</code>\n"
+    "📂 Активные порты: <b>{ports}</b>"
+).format
+
+SERVER_INFO_TEMPLATE = (
+    "🏷️ Название: <b>{server_name}</b>\n"
+    "🛠️ Версия: <b>{version}</b>\n"
+    "👥 Игроки: <b>{players}/{max_players}</b>\n"
+    "🎮 Режим: <b>{gamemode}</b>\n"
+    "📝 MOTD: <i>{motd}</i>\n"
+    "🚪 Основной порт: <b>{port}</b>"
+).format
+
+logger = logging.getLogger(__name__)
+
+# C-расширение (sendmmsg + recvmmsg в одном вызове) - опционально,
+# собирается через `python setup.py build_ext --inplace`
+try:
+    import _bedrock_scan
+except ImportError:
+    _bedrock_scan = None
+
+# Ограничивает число одновременных сканов, чтобы толпа пользователей
+# не раздула память и не забила канал бурстами UDP
+SCAN_SEMAPHORE = asyncio.Semaphore(MAX_CONCURRENT_SCANS)
+
+def escape_html(text: str) -> str:
+    """Экранирование HTML-символов в тексте"""
+    if not text:
+        return ""
+    return text.replace("&", "&amp;").replace("<", "&lt;").replace(">", "&gt;")
+
+_RESOLVE_CACHE = {}
+_IPV4_RE = re.compile(r'^\d{1,3}(?:\.\d{1,3}){3}$')
+
+async def is_valid_host(host: str):
+    """Резолвит хост в IPv4 через event loop, возвращает IP либо None.
+
+    DNS уходит в пул резолвера loop-а и не блокирует остальных
+    пользователей. Кэшируется: одни и те же хосты сканируют постоянно.
+    """
+    # Литеральный IPv4 резолвить незачем - getaddrinfo даже для него
+    # может сходить в NSS и потерять десятки миллисекунд
+    if _IPV4_RE.match(host):
+        try:
+            socket.inet_aton(host)
+        except OSError:
+            return None
+        return host
+    if host in _RESOLVE_CACHE:
+        return _RESOLVE_CACHE[host]
+    try:
+        infos = await asyncio.get_running_loop().getaddrinfo(
+            host, None, family=socket.AF_INET, type=socket.SOCK_DGRAM
+        )
+        ip = infos[0][4][0]
+    except socket.gaierror:
+        ip = None
+    if len(_RESOLVE_CACHE) >= 1024:
+        _RESOLVE_CACHE.clear()
+    _RESOLVE_CACHE[host] = ip
+    return ip
+
+# sendmmsg(2) есть только на Linux - на остальных платформах шлём по одному
+SENDMMSG_BATCH = 64
+
+_libc = None
+if sys.platform.startswith('linux'):
+    try:
+        _libc = ctypes.CDLL(None, use_errno=True)
+        _libc.sendmmsg
+    except (OSError, AttributeError):
+        _libc = None
+
+class _sockaddr_in(ctypes.Structure):
+    _fields_ = [
+        ('sin_family', ctypes.c_uint16),
+        ('sin_port', ctypes.c_uint16),
+        ('sin_addr', ctypes.c_uint32),
+        ('sin_zero', ctypes.c_char * 8),
+    ]
+
+class _iovec(ctypes.Structure):
+    _fields_ = [
+        ('iov_base', ctypes.c_void_p),
+        ('iov_len', ctypes.c_size_t),
+    ]
+
+class _msghdr(ctypes.Structure):
+    _fields_ = [
+        ('msg_name', ctypes.c_void_p),
+        ('msg_namelen', ctypes.c_uint32),
+        ('msg_iov', ctypes.POINTER(_iovec)),
+        ('msg_iovlen', ctypes.c_size_t),
+        ('msg_control', ctypes.c_void_p),
+        ('msg_controllen', ctypes.c_size_t),
+        ('msg_flags', ctypes.c_int),
+    ]
+
+class _mmsghdr(ctypes.Structure):
+    _fields_ = [
+        ('msg_hdr', _msghdr),
+        ('msg_len', ctypes.c_uint32),
+    ]
+
+def _sendmmsg_ports(fd: int, ip: str, ports) -> None:
+    """Отправка пачки проб одним вызовом sendmmsg(2)"""
+    count = len(ports)
+    # Пакеты одинаковой длины лежат подряд в одном буфере,
+    # iovec-и указывают на смещения в нём
+    blob = b''.join(PROBE_PACKETS[port] for port in ports)
+    plen = len(blob) // count
+    buf = ctypes.create_string_buffer(blob, len(blob))
+    base = ctypes.addressof(buf)
+    iovs = (_iovec * count)()
+    addrs = (_sockaddr_in * count)()
+    hdrs = (_mmsghdr * count)()
+    ip_raw = struct.unpack('=I', socket.inet_aton(ip))[0]
+
+    for i, port in enumerate(ports):
+        iovs[i] = _iovec(ctypes.c_void_p(base + i * plen), plen)
+        addrs[i].sin_family = socket.AF_INET
+        addrs[i].sin_port = socket.htons(port)
+        addrs[i].sin_addr = ip_raw
+        hdrs[i].msg_hdr.msg_name = ctypes.cast(ctypes.pointer(addrs[i]), ctypes.c_void_p)
+        hdrs[i].msg_hdr.msg_namelen = ctypes.sizeof(_sockaddr_in)
+        hdrs[i].msg_hdr.msg_iov = ctypes.pointer(iovs[i])
+        hdrs[i].msg_hdr.msg_iovlen = 1
+
+    sent = 0
+    while sent < count:
+        n = _libc.sendmmsg(
+            fd,
+            ctypes.byref(hdrs, sent * ctypes.sizeof(_mmsghdr)),
+            count - sent,
+            0
+        )
+        if n <= 0:
+            raise OSError(ctypes.get_errno(), "sendmmsg failed")
+        sent += n
+
+class BedrockProbe(asyncio.DatagramProtocol):
+    """Протокол приёма unconnected pong, общий для всех сканов"""
+
+    def __init__(self):
+        self.scans = {}  # ip -> состояние текущего скана этого ip
+        self.refs = {}   # ip -> сколько сканов его сейчас ждут
+
+    def register(self, ip):
+        # Параллельные сканы одного ip делят одно состояние - ответы общие
+        if ip not in self.scans:
+            self.scans[ip] = {'active': {}, 'payload': {}, 'first_reply': asyncio.Event()}
+            self.refs[ip] = 0
+        self.refs[ip] += 1
+        return self.scans[ip]
+
+    def unregister(self, ip):
+        self.refs[ip] -= 1
+        if self.refs[ip] == 0:
+            del self.scans[ip]
+            del self.refs[ip]
+
+    def datagram_received(self, data, addr):
+        state = self.scans.get(addr[0])
+        if state is None or not data or data[0] != 0x1c or len(data) < 9:
+            return
+        # Порт берём из куки, которую pong эхом вернул в поле timestamp
+        port = struct.unpack('>Q', data[1:9])[0]
+        if not PORT_RANGE[0] <= port <= PORT_RANGE[1]:
+            # Кука не наша (сервер её не вернул) - верим src-порту
+            port = addr[1]
+        state['active'][port] = True
+        state['first_reply'].set()
+        # Pong уже содержит все поля server_info - сохраняем,
+        # чтобы не гонять второй пинг после скана
+        state['payload'].setdefault(port, bytes(data))
+
+# Сколько исходящих сокетов на скан: файрволы часто режут UDP по 5-tuple
+# или по src-порту, раскладка проб по нескольким src-портам это обходит
+N_SRC_SOCKETS = 4
+
+# Общие эндпоинты живут между сканами - сокеты не создаются на каждую команду
+_scan_endpoints = None
+
+async def _get_scan_endpoints():
+    """Ленивая инициализация общих UDP-эндпоинтов.
+
+    Все транспорты делят один BedrockProbe: куки-демультиплексация не
+    зависит от того, на какой src-порт пришёл ответ.
+    """
+    global _scan_endpoints
+    if _scan_endpoints is None or any(t.is_closing() for t in _scan_endpoints[0]):
+        if _scan_endpoints is not None:
+            for t in _scan_endpoints[0]:
+                t.close()
+        loop = asyncio.get_running_loop()
+        protocol = BedrockProbe()
+        transports = []
+        for _ in range(N_SRC_SOCKETS):
+            transport, _proto = await loop.create_datagram_endpoint(
+                lambda: protocol,
+                family=socket.AF_INET
+            )
+            sock = transport.get_extra_info('socket')
+            if sock is not None:
+                # Запас под бурст из 501 pong-а, чтобы ядро их молча не роняло
+                sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 8 * 1024 * 1024)
+                sock.setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF, 2 * 1024 * 1024)
+            transports.append(transport)
+        _scan_endpoints = (transports, protocol)
+    return _scan_endpoints
+
+async def scan_ports(ip: str, progress: dict = None) -> tuple:
+    """Асинхронное сканирование портов через один общий UDP-сокет.
+
+    Возвращает (active_ports, server_info первого ответившего порта).
+    В progress (если передан) кладёт живую мапу найденных портов.
+    """
+    if _bedrock_scan is not None:
+        # Весь горячий путь (отправка, poll, приём, демультиплексация)
+        # уходит в C одним блокирующим вызовом - гоняем его в экзекьюторе
+        loop = asyncio.get_running_loop()
+        try:
+            active_ports, payload = await loop.run_in_executor(
+                None,
+                _bedrock_scan.scan,
+                ip,
+                PORT_RANGE[0],
+                PORT_RANGE[1],
+                int(SCAN_TIMEOUT * 1000),
+                int(FIRST_REPLY_GRACE * 1000)
+            )
+        except OSError:
+            logger.warning("C-сканер упал, откатываюсь на Python-путь")
+        else:
+            server_info = None
+            if active_ports:
+                if progress is not None:
+                    progress['active'] = dict.fromkeys(active_ports, True)
+                server_info = parse_server_info(payload, active_ports[0])
+            return active_ports, server_info
+
+    transports, protocol = await _get_scan_endpoints()
+    state = protocol.register(ip)
+    if progress is not None:
+        progress['active'] = state['active']
+    ports = range(PORT_RANGE[0], PORT_RANGE[1] + 1)
+    try:
+        sent_batched = False
+        socks = [t.get_extra_info('socket') for t in transports]
+        if _libc is not None and all(s is not None for s in socks):
+            try:
+                # ~500 вызовов sendto сворачиваются в ~8 вызовов sendmmsg,
+                # батчи идут по сокетам по кругу - src-порты чередуются
+                for bi, i in enumerate(range(0, len(ports), SENDMMSG_BATCH)):
+                    fd = socks[bi % len(socks)].fileno()
+                    _sendmmsg_ports(fd, ip, ports[i:i + SENDMMSG_BATCH])
+                    # Миллисекунда между батчами - очередь NIC цели успевает
+                    # разгрестись, меньше потерь на приёмной стороне
+                    await asyncio.sleep(0.001)
+                sent_batched = True
+            except OSError:
+                logger.warning("sendmmsg не сработал, откатываюсь на sendto")
+        if not sent_batched:
+            for i, port in enumerate(ports):
+                transports[port % len(transports)].sendto(PROBE_PACKETS[port], (ip, port))
+                # Передышка каждые 32 отправки, чтобы не терять пакеты в бурсте
+                if i % 32 == 31:
+                    await asyncio.sleep(0.001)
+        # Если хост ответил - соседние порты ответят за тот же RTT,
+        # и полный таймаут ждать незачем
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + SCAN_TIMEOUT
+        try:
+            await asyncio.wait_for(state['first_reply'].wait(), SCAN_TIMEOUT)
+        except asyncio.TimeoutError:
+            pass
+        else:
+            await asyncio.sleep(min(FIRST_REPLY_GRACE, max(deadline - loop.time(), 0)))
+    finally:
+        protocol.unregister(ip)
+
+    active_ports = sorted(state['active'])
+    server_info = None
+    if active_ports:
+        server_info = parse_server_info(state['payload'][active_ports[0]], active_ports[0])
+    return active_ports, server_info
+
+def parse_server_info(data: bytes, port: int):
+    """Разбор полей unconnected pong.
+
+    Декодируем только то, что реально попадает в ответ бота; edition,
+    protocol и server_id всё равно нигде не показываются.
+    """
+    # maxsplit=9: хвост после девятого ';' нам не нужен целиком
+    server_info = data[33:].split(b';', 9)
+    if len(server_info) < 9:
+        return None
+
+    return {
+        'motd': safe_decode(server_info[1]),
+        'version': safe_decode(server_info[3]),
+        'players': safe_decode(server_info[4]),
+        'max_players': safe_decode(server_info[5]),
+        'server_name': safe_decode(server_info[7]),
+        'gamemode': safe_decode(server_info[8]),
+        'port': port
+    }
+
+def safe_decode(byte_str):
+    """Безопасное декодирование строки"""
+    # Кодек сам подставит � вместо битых байт - без исключений
+    return byte_str.decode('utf-8', errors='replace')
+
+async def progress_updater(context, message, progress: dict) -> None:
+    """Обновляет сообщение о ходе скана не чаще раза в секунду.
+
+    Один edit в тик - укладываемся в лимиты Telegram даже на долгих сканах.
+    """
+    last_text = None
+    while True:
+        await asyncio.sleep(1.0)
+        found = len(progress.get('active', ()))
+        text = (
+            f"🔎 Сканирую порты... найдено серверов: {found}\n"
+            "⏳ Пожалуйста, подождите..."
+        )
+        if text == last_text:
+            continue
+        try:
+            await context.bot.edit_message_text(
+                chat_id=message.chat_id,
+                message_id=message.message_id,
+                text=text
+            )
+        except Exception:
+            # Прогресс не критичен - скан важнее
+            pass
+        last_text = text
+
+def format_results(host: str, active_ports: list, server_info: dict, scan_time: float) -> str:
+    """Форматирование результатов сканирования"""
+    timestamp = datetime.now().strftime("%d.%m.%Y %H:%M")
+
+    # Экранируем все динамические данные
+    safe_host = escape_html(host)
+
+    if not active_ports:
+        return NO_PORTS_TEMPLATE(
+            ts=timestamp, host=safe_host, port_count=PORT_COUNT, scan_time=scan_time
+        )
+
+    ports_str = ", ".join(map(str, active_ports[:10]))
+    if len(active_ports) > 10:
+        ports_str += f" (+{len(active_ports)-10} других)"
+
+    result = [
+        RESULT_HEADER_TEMPLATE(
+            ts=timestamp, host=safe_host, port_count=PORT_COUNT, ports=ports_str
+        )
+    ]
+
+    if server_info:
+        result.append(SERVER_INFO_TEMPLATE(
+            server_name=escape_html(server_info['server_name']),
+            version=escape_html(server_info['version']),
+            players=escape_html(server_info['players']),
+            max_players=escape_html(server_info['max_players']),
+            gamemode=escape_html(server_info['gamemode']),
+            motd=escape_html(server_info['motd']),
+            port=server_info['port']
+        ))
+
+    result.append(f"\n⏱ Время сканирования: {scan_time:.2f} сек")
+    return "\n".join(result)
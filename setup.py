@@ -0,0 +1,39 @@
+"""Сборка C-расширения сканера: python setup.py build_ext --inplace
+
+Опциональные флаги (по умолчанию выключены, чтобы wheel оставался переносимым):
+  BEDROCK_SCAN_NATIVE=1       -O3 -march=native -flto под конкретную машину
+  BEDROCK_SCAN_PGO=generate   тренировочная сборка с -fprofile-generate;
+                              после неё прогнать несколько сканов
+  BEDROCK_SCAN_PGO=use        финальная пересборка с -fprofile-use по .gcda
+"""
+import os
+from setuptools import setup, Extension
+
+extra_compile_args = ["-O2"]
+extra_link_args = []
+
+if os.environ.get("BEDROCK_SCAN_NATIVE") == "1":
+    extra_compile_args = ["-O3", "-march=native", "-flto"]
+    extra_link_args = ["-flto"]
+
+_pgo = os.environ.get("BEDROCK_SCAN_PGO")
+if _pgo == "generate":
+    extra_compile_args.append("-fprofile-generate")
+    extra_link_args.append("-fprofile-generate")
+elif _pgo == "use":
+    extra_compile_args.append("-fprofile-use")
+    extra_link_args.append("-fprofile-use")
+
+setup(
+    name="bedrock-scanner",
+    version="0.1",
+    py_modules=["bedrock_core"],
+    ext_modules=[
+        Extension(
+            "_bedrock_scan",
+            sources=["_bedrock_scan.c"],
+            extra_compile_args=extra_compile_args,
+            extra_link_args=extra_link_args,
+        )
+    ],
+)